@@ -1,5 +1,8 @@
 import os
 import json
+import gzip
+import time
+import copy
 import asyncio
 from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
@@ -9,6 +12,7 @@ from msgraph import GraphServiceClient
 from mcp.server.sse import SseServerTransport
 from starlette.routing import Mount
 from typing import Dict, List, Optional, Any
+from urllib.parse import urlsplit, parse_qsl
 from load_env import load_environment
 
 # Load environment variables
@@ -77,6 +81,66 @@ async def get_graph_client():
     client = GraphServiceClient(credentials=credentials, scopes=scopes)
     return client
 
+# Single-flight for Graph GET requests, shared by every MCP session in this process
+_inflight_requests: Dict[tuple, Dict[str, Any]] = {}
+request_stats = {"requests": 0, "upstream": 0, "shared": 0}
+
+def normalize_graph_request(request_url: str, headers: Optional[Dict[str, str]] = None) -> tuple:
+    """Build a key that is equal for requests Graph would answer identically."""
+    parts = urlsplit(request_url)
+    query = []
+    for k, v in parse_qsl(parts.query, keep_blank_values=True):
+        k = k.lower()
+        if k == "$select":
+            # Property order does not change the response
+            v = ",".join(sorted(p.strip() for p in v.split(",") if p.strip()))
+        query.append((k, v.strip()))
+    path = parts.netloc.lower() + parts.path.rstrip("/").lower()
+    header_items = tuple(sorted((k.lower(), v) for k, v in (headers or {}).items()))
+    return (path, tuple(sorted(query)), header_items)
+
+async def graph_get(client, request_url: str, headers: Optional[Dict[str, str]] = None) -> Any:
+    """GET a Graph resource, sharing one upstream call between concurrent identical requests.
+
+    The shared request runs as its own task and callers wait on it through
+    asyncio.shield, so cancelling one caller never aborts it for the others.
+    The caller that started the request gets the response body itself unless
+    others joined it; everyone else gets a copy, so no caller sees another's changes.
+    """
+    key = normalize_graph_request(request_url, headers)
+    request_stats["requests"] += 1
+
+    entry = _inflight_requests.get(key)
+    leader = entry is None
+    if leader:
+        async def fetch():
+            if headers:
+                response = await client._client.get(request_url, headers=headers)
+            else:
+                response = await client._client.get(request_url)
+            return await response.json()
+
+        def release(done: asyncio.Task):
+            if _inflight_requests.get(key, {}).get("task") is done:
+                del _inflight_requests[key]
+            # Mark the error as retrieved in case every caller was cancelled
+            if not done.cancelled():
+                done.exception()
+
+        request_stats["upstream"] += 1
+        entry = {"task": asyncio.ensure_future(fetch()), "waiters": 0}
+        _inflight_requests[key] = entry
+        entry["task"].add_done_callback(release)
+    else:
+        request_stats["shared"] += 1
+        entry["waiters"] += 1
+
+    result = await asyncio.shield(entry["task"])
+    # The entry stops accepting waiters once the task is done, so this count is final
+    if leader and not entry["waiters"]:
+        return result
+    return copy.deepcopy(result)
+
 # MCP Server endpoint
 @app.get("/sse", tags=["MCP"], dependencies=[Depends(ensure_valid_api_key)])
 async def handle_sse(request: Request):
@@ -224,6 +288,59 @@ async def add_graph_tools(server):
         ],
         on_call=get_group_members,
     )
+    
+    # Export Directory Tool
+    server.add_tool(
+        name="exportDirectory",
+        description="Export all users and/or groups from Microsoft Entra ID tenant to gzip-compressed NDJSON files on disk",
+        parameters=[
+            {
+                "name": "path",
+                "type": "string",
+                "description": "Directory to write the export files and checkpoint to",
+                "required": True,
+            },
+            {
+                "name": "objectType",
+                "type": "string",
+                "description": "Objects to export: users, groups or all (default all)",
+                "required": False,
+            },
+            {
+                "name": "boundaries",
+                "type": "string",
+                "description": "Comma-separated name prefixes used to split the scan into partitions (default b..z)",
+                "required": False,
+            },
+            {
+                "name": "concurrency",
+                "type": "integer",
+                "description": "Number of partitions to fetch at the same time (default 4)",
+                "required": False,
+            },
+            {
+                "name": "select",
+                "type": "string",
+                "description": "Comma-separated list of properties to include",
+                "required": False,
+            },
+            {
+                "name": "resume",
+                "type": "boolean",
+                "description": "Resume an interrupted export from its checkpoint (default true)",
+                "required": False,
+            },
+        ],
+        on_call=export_directory,
+    )
+    
+    # Request Stats Tool
+    server.add_tool(
+        name="getRequestStats",
+        description="Show how many Microsoft Graph requests were shared between identical concurrent calls",
+        parameters=[],
+        on_call=get_request_stats,
+    )
 
 # Tool implementations
 async def list_users(params: Dict[str, Any]):
@@ -250,8 +367,7 @@ async def list_users(params: Dict[str, Any]):
             request_url += "?" + "&".join([f"{k}={v}" for k, v in query_params.items()])
         
         # Make the request
-        response = await client._client.get(request_url)
-        users = await response.json()
+        users = await graph_get(client, request_url)
         
         return users
     except Exception as e:
@@ -271,8 +387,7 @@ async def get_user(params: Dict[str, Any]):
             request_url += f"?$select={select_param}"
         
         # Make the request
-        response = await client._client.get(request_url)
-        user = await response.json()
+        user = await graph_get(client, request_url)
         
         return user
     except Exception as e:
@@ -299,8 +414,7 @@ async def search_users(params: Dict[str, Any]):
         # Make the request
         # Note: Using the /search endpoint requires ConsistencyLevel header
         headers = {"ConsistencyLevel": "eventual"}
-        response = await client._client.get(request_url, headers=headers)
-        users = await response.json()
+        users = await graph_get(client, request_url, headers=headers)
         
         return users
     except Exception as e:
@@ -327,8 +441,7 @@ async def list_groups(params: Dict[str, Any]):
             request_url += "?" + "&".join([f"{k}={v}" for k, v in query_params.items()])
         
         # Make the request
-        response = await client._client.get(request_url)
-        groups = await response.json()
+        groups = await graph_get(client, request_url)
         
         return groups
     except Exception as e:
@@ -348,13 +461,269 @@ async def get_group_members(params: Dict[str, Any]):
             request_url += f"?$top={top}"
         
         # Make the request
-        response = await client._client.get(request_url)
-        members = await response.json()
+        members = await graph_get(client, request_url)
         
         return members
     except Exception as e:
         return {"error": str(e)}
 
+async def get_request_stats(params: Dict[str, Any]):
+    return {
+        "requests": request_stats["requests"],
+        "upstreamCalls": request_stats["upstream"],
+        "upstreamCallsSaved": request_stats["shared"],
+        "inFlight": len(_inflight_requests),
+    }
+
+# Directory export
+EXPORT_OBJECT_TYPES = {
+    "users": {
+        "key": "userPrincipalName",
+        "select": "id,displayName,userPrincipalName,mail,jobTitle,department,accountEnabled",
+    },
+    "groups": {
+        "key": "displayName",
+        "select": "id,displayName,mail,mailEnabled,securityEnabled,groupTypes",
+    },
+}
+EXPORT_DEFAULT_BOUNDARIES = list("bcdefghijklmnopqrstuvwxyz")
+EXPORT_CHECKPOINT_FILE = "checkpoint.json"
+
+def build_export_partitions(object_types: List[str], boundaries: List[str]) -> List[Dict[str, Any]]:
+    """Split each object type into key ranges.
+
+    Graph only supports ge/le on directory names, so every range is closed and
+    rows equal to the upper bound are dropped client-side (the next partition
+    picks them up). The first and last ranges are open-ended so nothing falls
+    outside the scan.
+    """
+    def quote(value: str) -> str:
+        # OData string literals escape a single quote by doubling it
+        return "'" + value.replace("'", "''") + "'"
+
+    partitions = []
+    bounds = [None] + sorted(set(b.lower() for b in boundaries if b)) + [None]
+    for object_type in object_types:
+        key = EXPORT_OBJECT_TYPES[object_type]["key"]
+        for index, (low, high) in enumerate(zip(bounds, bounds[1:])):
+            clauses = []
+            if low is not None:
+                clauses.append(f"{key} ge {quote(low)}")
+            if high is not None:
+                clauses.append(f"{key} le {quote(high)}")
+            partitions.append({
+                "name": f"{object_type}-{index:03d}",
+                "objectType": object_type,
+                "key": key,
+                "filter": " and ".join(clauses),
+                "high": high,
+            })
+    return partitions
+
+def parse_bool(value: Any) -> bool:
+    # Tool arguments may arrive as strings, where "false" would otherwise be truthy
+    if isinstance(value, str):
+        if value.strip().lower() in ("true", "1", "yes"):
+            return True
+        if value.strip().lower() in ("false", "0", "no", ""):
+            return False
+        raise ValueError(f"Invalid boolean value: {value}")
+    return bool(value)
+
+def load_export_checkpoint(path: str) -> Dict[str, Any]:
+    checkpoint_path = os.path.join(path, EXPORT_CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return {}
+    with open(checkpoint_path, "r") as f:
+        return json.load(f)
+
+def save_export_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    # Write to a temporary file first so an interrupted write never corrupts the checkpoint
+    checkpoint_path = os.path.join(path, EXPORT_CHECKPOINT_FILE)
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, checkpoint_path)
+
+async def run_export_io(func, *args):
+    """Run blocking file I/O in a thread and let it finish even if the caller is cancelled.
+
+    Otherwise a cancelled partition could still be writing when a retried export truncates its file.
+    """
+    future = asyncio.get_running_loop().run_in_executor(None, func, *args)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await future
+        raise
+
+async def checkpoint_export(path: str, checkpoint: Dict[str, Any], lock: asyncio.Lock):
+    """Save a snapshot of the checkpoint without blocking the event loop.
+
+    The lock keeps saves in order, so an older snapshot never replaces a newer one.
+    """
+    async with lock:
+        snapshot = copy.deepcopy(checkpoint)
+        await run_export_io(save_export_checkpoint, path, snapshot)
+
+def remove_export_files(path: str, object_types: List[str]):
+    # Remove every earlier partition file, not just the ones this run will rewrite
+    for file_name in os.listdir(path):
+        if file_name.endswith(".ndjson.gz") and file_name.split("-", 1)[0] in object_types:
+            os.remove(os.path.join(path, file_name))
+
+def truncate_export_file(file_path: str, offset: int):
+    with open(file_path, "ab") as f:
+        f.truncate(offset)
+
+def append_export_rows(file_path: str, rows: List[Dict[str, Any]]) -> int:
+    """Append rows as a new gzip member and return the resulting file size."""
+    with open(file_path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for row in rows:
+                gz.write(json.dumps(row, separators=(",", ":")).encode("utf-8") + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+        return raw.tell()
+
+async def export_partition(client, path: str, partition: Dict[str, Any], select_param: Optional[str],
+                           checkpoint: Dict[str, Any], checkpoint_lock: asyncio.Lock) -> int:
+    name = partition["name"]
+    state = checkpoint["partitions"].setdefault(name, {"rows": 0, "offset": 0, "nextLink": None, "done": False})
+    if state["done"]:
+        return 0
+
+    file_path = os.path.join(path, f"{name}.ndjson.gz")
+    # Drop anything written after the last checkpoint so resumed pages are not duplicated
+    await run_export_io(truncate_export_file, file_path, state["offset"])
+
+    request_url = state["nextLink"]
+    if not request_url:
+        select = (select_param or EXPORT_OBJECT_TYPES[partition["objectType"]]["select"]).split(",")
+        # The partition key is needed to drop rows on the upper bound
+        if partition["key"] not in [p.strip() for p in select]:
+            select.append(partition["key"])
+        query_params = {
+            "$top": "999",
+            "$filter": partition["filter"],
+            "$select": ",".join(select),
+            "$count": "true",
+        }
+        query_params = {k: v for k, v in query_params.items() if v}
+        request_url = f"/{partition['objectType']}?" + "&".join([f"{k}={v}" for k, v in query_params.items()])
+
+    # Range filters on directory names are advanced queries
+    headers = {"ConsistencyLevel": "eventual"}
+    high = partition["high"]
+    exported = 0
+
+    while request_url:
+        page = await graph_get(client, request_url, headers=headers)
+        if "error" in page:
+            raise RuntimeError(f"{name}: {page['error']}")
+
+        rows = page.get("value", [])
+        if high is not None:
+            rows = [row for row in rows if (row.get(partition["key"]) or "").lower() != high]
+
+        if rows:
+            state["offset"] = await run_export_io(append_export_rows, file_path, rows)
+        state["rows"] += len(rows)
+        state["nextLink"] = page.get("@odata.nextLink")
+        state["done"] = not state["nextLink"]
+        await checkpoint_export(path, checkpoint, checkpoint_lock)
+
+        exported += len(rows)
+        request_url = state["nextLink"]
+
+    return exported
+
+# Export directories with an export currently running in this process
+_active_exports = set()
+
+async def run_export(path: str, object_types: List[str], boundaries: List[str], concurrency: int,
+                     select_param: Optional[str], resume: bool) -> Dict[str, Any]:
+    await run_export_io(lambda: os.makedirs(path, exist_ok=True))
+    partitions = build_export_partitions(object_types, boundaries)
+    settings = {"partitions": [p["filter"] for p in partitions], "select": select_param}
+
+    checkpoint = await run_export_io(load_export_checkpoint, path) if resume else {}
+    states = checkpoint.get("partitions", {})
+    finished = all(states.get(p["name"], {}).get("done") for p in partitions)
+    # Only resume an unfinished export; a checkpoint from a differently
+    # partitioned export cannot be reused, and a finished one would be stale
+    resumed = checkpoint.get("settings") == settings and not finished
+    if not resumed:
+        checkpoint = {}
+        await run_export_io(remove_export_files, path, object_types)
+    checkpoint.setdefault("settings", settings)
+    checkpoint.setdefault("partitions", {})
+    await run_export_io(save_export_checkpoint, path, checkpoint)
+
+    client = await get_graph_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint_lock = asyncio.Lock()
+
+    async def run(partition):
+        async with semaphore:
+            return await export_partition(client, path, partition, select_param, checkpoint, checkpoint_lock)
+
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(run(p)) for p in partitions]
+    try:
+        exported = await asyncio.gather(*tasks)
+    except BaseException:
+        # Stop the remaining partitions so nothing keeps writing after the export has failed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    elapsed = time.monotonic() - started
+
+    rows = sum(exported)
+    return {
+        "path": os.path.abspath(path),
+        "objectTypes": object_types,
+        "partitions": len(partitions),
+        "resumed": resumed,
+        "rowsExported": rows,
+        "rowsTotal": sum(state["rows"] for state in checkpoint["partitions"].values()),
+        "elapsedSeconds": round(elapsed, 3),
+        "rowsPerSecond": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+async def export_directory(params: Dict[str, Any]):
+    try:
+        path = params.get("path")
+        if not path:
+            raise ValueError("path is required")
+
+        object_type = params.get("objectType", "all")
+        if object_type == "all":
+            object_types = list(EXPORT_OBJECT_TYPES)
+        elif object_type in EXPORT_OBJECT_TYPES:
+            object_types = [object_type]
+        else:
+            raise ValueError(f"Unsupported objectType: {object_type}")
+
+        boundaries_param = params.get("boundaries")
+        boundaries = [b.strip() for b in boundaries_param.split(",") if b.strip()] if boundaries_param else []
+        boundaries = boundaries or EXPORT_DEFAULT_BOUNDARIES
+        concurrency = max(int(params.get("concurrency", 4)), 1)
+        select_param = params.get("select", None)
+        resume = parse_bool(params.get("resume", True))
+
+        export_key = os.path.realpath(path)
+        if export_key in _active_exports:
+            raise ValueError(f"An export to {path} is already running")
+        _active_exports.add(export_key)
+        try:
+            return await run_export(path, object_types, boundaries, concurrency, select_param, resume)
+        finally:
+            _active_exports.discard(export_key)
+    except Exception as e:
+        return {"error": str(e)}
+
 def main():
     """Entry point for running the server as a module."""
     import uvicorn
@@ -0,0 +1,179 @@
+import os
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import mcp_microsoft_graph as graph
+from scripts.benchmark_export import FakeGraphClient, read_export_ids, synthetic_users
+
+def user(upn):
+    return {"id": upn, "displayName": upn, "userPrincipalName": upn}
+
+def tenant(count, *extra):
+    # Users named exactly like a boundary land on the edge between two partitions
+    users = synthetic_users(count) + [user(upn) for upn in extra]
+    users.sort(key=lambda u: u["userPrincipalName"])
+    return users
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    state = {}
+
+    def use(users, **kwargs):
+        state["client"] = FakeGraphClient(users, page_size=50, **kwargs)
+        return state["client"]
+
+    async def get_graph_client():
+        return SimpleNamespace(_client=state["client"])
+
+    monkeypatch.setattr(graph, "get_graph_client", get_graph_client)
+    monkeypatch.setattr(graph, "_inflight_requests", {})
+    return use
+
+def export(path, **params):
+    return asyncio.run(graph.export_directory(dict({"path": str(path), "objectType": "users"}, **params)))
+
+def assert_exported_once(path, users):
+    ids = read_export_ids(str(path))
+    assert sorted(ids) == sorted(u["id"] for u in users)
+
+def test_partitions_are_open_ended_and_closed_in_between():
+    partitions = graph.build_export_partitions(["users"], ["m", "F", ""])
+
+    assert [p["filter"] for p in partitions] == [
+        "userPrincipalName le 'f'",
+        "userPrincipalName ge 'f' and userPrincipalName le 'm'",
+        "userPrincipalName ge 'm'",
+    ]
+    assert [p["high"] for p in partitions] == ["f", "m", None]
+    assert [p["name"] for p in partitions] == ["users-000", "users-001", "users-002"]
+
+def test_partition_boundaries_escape_quotes():
+    partitions = graph.build_export_partitions(["groups"], ["o'b"])
+
+    assert [p["filter"] for p in partitions] == [
+        "displayName le 'o''b'",
+        "displayName ge 'o''b'",
+    ]
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False), ("true", True), ("False", False), ("0", False), ("yes", True), ("", False),
+])
+def test_parse_bool(value, expected):
+    assert graph.parse_bool(value) is expected
+
+def test_parse_bool_rejects_unknown_strings():
+    with pytest.raises(ValueError):
+        graph.parse_bool("maybe")
+
+def test_export_writes_every_row_once(fake_graph, tmp_path):
+    users = tenant(500, "f", "m", "o'b")
+    fake_graph(users)
+
+    result = export(tmp_path, boundaries="f,m,o'b")
+
+    assert result["rowsExported"] == len(users)
+    assert result["partitions"] == 4
+    assert_exported_once(tmp_path, users)
+
+def test_export_selects_partition_key(fake_graph, tmp_path):
+    users = tenant(200, "f", "m")
+    client = fake_graph(users)
+    seen = []
+    get = client.get
+
+    async def recording_get(request_url, headers=None):
+        seen.append(request_url)
+        return await get(request_url, headers)
+
+    client.get = recording_get
+
+    export(tmp_path, boundaries="f,m", select="id")
+
+    assert all("$select=id,userPrincipalName" in url for url in seen if "skip=" not in url)
+    assert_exported_once(tmp_path, users)
+
+def test_export_strips_boundary_whitespace(fake_graph, tmp_path):
+    fake_graph(tenant(100))
+
+    export(tmp_path, boundaries="m, f,,")
+
+    with open(tmp_path / graph.EXPORT_CHECKPOINT_FILE) as f:
+        settings = json.load(f)["settings"]
+    assert settings["partitions"] == [
+        "userPrincipalName le 'f'",
+        "userPrincipalName ge 'f' and userPrincipalName le 'm'",
+        "userPrincipalName ge 'm'",
+    ]
+
+def test_resume_truncates_rows_written_after_checkpoint(fake_graph, tmp_path):
+    users = tenant(2000)
+    client = fake_graph(users, fail_after=10)
+
+    result = export(tmp_path, boundaries="g,p", concurrency=1)
+    assert "error" in result
+
+    # Simulate a crash between writing a page and saving the checkpoint
+    with open(tmp_path / graph.EXPORT_CHECKPOINT_FILE) as f:
+        states = json.load(f)["partitions"]
+    unfinished = next(name for name, state in states.items() if not state["done"])
+    graph.append_export_rows(str(tmp_path / f"{unfinished}.ndjson.gz"), [user("duplicate")])
+
+    client.fail_after = None
+    result = export(tmp_path, boundaries="g,p", concurrency=1)
+
+    assert result["resumed"] is True
+    assert result["rowsTotal"] == len(users)
+    assert_exported_once(tmp_path, users)
+
+def test_resume_false_string_starts_over(fake_graph, tmp_path):
+    users = tenant(300)
+    client = fake_graph(users, fail_after=3)
+    export(tmp_path, boundaries="m", concurrency=1)
+
+    client.fail_after = None
+    result = export(tmp_path, boundaries="m", resume="false")
+
+    assert result["resumed"] is False
+    assert result["rowsExported"] == len(users)
+    assert_exported_once(tmp_path, users)
+
+def test_finished_export_runs_again(fake_graph, tmp_path):
+    fake_graph(tenant(300))
+    export(tmp_path, boundaries="m")
+
+    users = tenant(350)
+    fake_graph(users)
+    result = export(tmp_path, boundaries="m")
+
+    assert result["resumed"] is False
+    assert result["rowsExported"] == len(users)
+    assert_exported_once(tmp_path, users)
+
+def test_changed_settings_remove_stale_files(fake_graph, tmp_path):
+    users = tenant(300)
+    fake_graph(users)
+    export(tmp_path, boundaries="d,h,m,r,w")
+    assert (tmp_path / "users-005.ndjson.gz").exists()
+
+    fake_graph(users, fail_after=2)
+    export(tmp_path, boundaries="m", concurrency=1)
+
+    # Only the two partitions of the new export may have files
+    assert set(os.listdir(tmp_path)) <= {graph.EXPORT_CHECKPOINT_FILE, "users-000.ndjson.gz", "users-001.ndjson.gz"}
+
+def test_concurrent_export_to_same_path_is_refused(fake_graph, tmp_path):
+    fake_graph(tenant(300), latency=0.01)
+
+    async def run():
+        first = asyncio.ensure_future(graph.export_directory({"path": str(tmp_path), "objectType": "users"}))
+        await asyncio.sleep(0)
+        second = await graph.export_directory({"path": str(tmp_path), "objectType": "users"})
+        return await first, second
+
+    first, second = asyncio.run(run())
+
+    assert "error" not in first
+    assert second == {"error": f"An export to {tmp_path} is already running"}
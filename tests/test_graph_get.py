@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import mcp_microsoft_graph as graph
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    async def json(self):
+        return self.body
+
+class FakeHttpClient:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    async def get(self, request_url, headers=None):
+        self.calls.append(request_url)
+        await asyncio.sleep(0.05)
+        if self.error:
+            raise self.error
+        return FakeResponse({"id": "vip", "displayName": "VIP", "businessPhones": ["555"]})
+
+def test_concurrent_identical_requests_share_one_upstream_call(monkeypatch):
+    monkeypatch.setattr(graph, "request_stats", {"requests": 0, "upstream": 0, "shared": 0})
+    http = FakeHttpClient()
+    client = SimpleNamespace(_client=http)
+
+    async def run():
+        first = asyncio.ensure_future(graph.graph_get(client, "/users/vip?$select=id,displayName"))
+        second = asyncio.ensure_future(graph.graph_get(client, "/users/vip?$select=displayName,id"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        return result
+
+    result = asyncio.run(run())
+
+    assert result == {"id": "vip", "displayName": "VIP", "businessPhones": ["555"]}
+    assert len(http.calls) == 1
+    assert graph.request_stats == {"requests": 2, "upstream": 1, "shared": 1}
+    assert graph._inflight_requests == {}
+
+def test_shared_callers_get_independent_copies(monkeypatch):
+    monkeypatch.setattr(graph, "request_stats", {"requests": 0, "upstream": 0, "shared": 0})
+    http = FakeHttpClient()
+    client = SimpleNamespace(_client=http)
+
+    async def run():
+        return await asyncio.gather(*[graph.graph_get(client, "/users/vip") for _ in range(3)])
+
+    first, second, third = asyncio.run(run())
+    first["businessPhones"].append("556")
+    second["displayName"] = "Changed"
+
+    assert third == {"id": "vip", "displayName": "VIP", "businessPhones": ["555"]}
+    assert first["displayName"] == "VIP"
+    assert second["businessPhones"] == ["555"]
+    assert len(http.calls) == 1
+
+def test_upstream_error_reaches_every_caller(monkeypatch):
+    monkeypatch.setattr(graph, "request_stats", {"requests": 0, "upstream": 0, "shared": 0})
+    http = FakeHttpClient(error=ConnectionError("graph unavailable"))
+    client = SimpleNamespace(_client=http)
+
+    async def run():
+        return await asyncio.gather(
+            graph.graph_get(client, "/groups?$top=5"),
+            graph.graph_get(client, "/groups?$top=5"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert [type(r) for r in results] == [ConnectionError, ConnectionError]
+    assert len(http.calls) == 1
+    assert graph.request_stats == {"requests": 2, "upstream": 1, "shared": 1}
+    assert graph._inflight_requests == {}